@@ -21,18 +21,25 @@ from collections import namedtuple
 
 AIY_BOARDS = {1: 'Voice-HAT', 2: 'Vision-Bonnet', 3: 'Voice-Bonnet'}
 
+CACHE_FILE = '/run/aiy_board_info.cache'
+
 Board = namedtuple('Board',
                    ['product', 'product_id', 'product_ver', 'uuid', 'vendor'])
 
 
 def simple_hash(data, length=4):
-    digest = hashlib.md5(data).digest()
-    return ''.join(str(digest[i] % 10) for i in range(length))
+    digest = hashlib.blake2s(data, digest_size=length).digest()
+    return ''.join(str(b % 10) for b in digest)
 
 
 def device_tree_node(node):
-    with open(os.path.join('/proc/device-tree/', node), 'rb') as f:
-        return f.read().replace(b'\x00', b'')
+    # Device tree properties are tiny null-terminated strings; skip
+    # buffered IO and just strip the trailing null.
+    fd = os.open('/proc/device-tree/' + node, os.O_RDONLY)
+    try:
+        return os.read(fd, 256).rstrip(b'\x00')
+    finally:
+        os.close(fd)
 
 
 def board_info():
@@ -55,8 +62,39 @@ def board_info():
     return 0, 'Raspberry-Pi-%s' % simple_hash(device_tree_node('serial-number'))
 
 
+def read_cache():
+    # The board identity is immutable for the lifetime of the boot, so any
+    # cache written after the device tree was populated is still valid.
+    try:
+        cache_stat = os.stat(CACHE_FILE)
+        if os.path.exists('/proc/device-tree/hat/'):
+            hat_stat = os.stat('/proc/device-tree/hat/')
+            if hat_stat.st_mtime_ns > cache_stat.st_mtime_ns:
+                return None
+        with open(CACHE_FILE, 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_cache(msg):
+    try:
+        tmp_file = CACHE_FILE + '.tmp'
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, msg.encode('utf-8'))
+        finally:
+            os.close(fd)
+        os.rename(tmp_file, CACHE_FILE)
+    except OSError:
+        pass  # /run may not be writable (e.g. not running as root).
+
+
 def main():
-    msg = 'AIY_BOARD_ID=%d\nAIY_BOARD_NAME=%s\n' % board_info()
+    msg = read_cache()
+    if msg is None:
+        msg = 'AIY_BOARD_ID=%d\nAIY_BOARD_NAME=%s\n' % board_info()
+        write_cache(msg)
     if len(sys.argv) == 2:
         with open(sys.argv[1], 'w') as f:
             f.write(msg)
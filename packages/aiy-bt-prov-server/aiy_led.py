@@ -0,0 +1,104 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared blink loop for the AIY kit LEDs."""
+import os
+import threading
+
+try:
+  import gpiod
+except ImportError:
+  gpiod = None
+
+
+def _write(path, data):
+  with open(path, 'w') as file:
+    file.write(str(data))
+
+
+def blink_loop(event, set_on, set_off, on_time, off_time):
+  """Toggles an LED until event is set."""
+  while True:
+    set_on()
+    if event.wait(on_time):
+      break
+    set_off()
+    if event.wait(off_time):
+      break
+
+
+class Blinker(object):
+  """Runs a blink loop on a daemon thread.
+
+  Subclasses implement _run(on_time, off_time) with the actual GPIO
+  access; the blink/off interface matches gpiozero's LED so the two are
+  interchangeable.
+  """
+
+  def __init__(self):
+    self._thread = None
+
+  def _run(self, on_time, off_time):
+    raise NotImplementedError
+
+  def blink(self, on_time, off_time):
+    self._event = threading.Event()
+    self._thread = threading.Thread(target=self._run,
+                                    args=(on_time, off_time), daemon=True)
+    self._thread.start()
+
+  def off(self):
+    if self._thread:
+      self._event.set()
+      self._thread.join()
+      self._thread = None
+
+
+class OnboardBlinker(Blinker):
+  """Blinker for the AIY onboard LEDs (0 or 1)."""
+
+  def __init__(self, led, base_gpio):
+    super(OnboardBlinker, self).__init__()
+    self._led = led
+    self._base_gpio = base_gpio
+
+  def _run(self, on_time, off_time):
+    if gpiod is not None:
+      self._run_gpiod(on_time, off_time)
+    else:
+      self._run_sysfs(on_time, off_time)
+
+  def _run_gpiod(self, on_time, off_time):
+    # One ioctl per toggle via the character device, instead of going
+    # through the deprecated sysfs interface.
+    line = gpiod.find_line('AIY_LED%d' % self._led)
+    line.request(consumer='aiy-trigger', type=gpiod.LINE_REQ_DIR_OUT)
+    try:
+      # LED is active low.
+      blink_loop(self._event, lambda: line.set_value(0),
+                 lambda: line.set_value(1), on_time, off_time)
+    finally:
+      line.release()
+
+  def _run_sysfs(self, on_time, off_time):
+    gpio = self._base_gpio + (13, 14)[self._led]
+    _write('/sys/class/gpio/export', gpio)
+    fd = os.open('/sys/class/gpio/AIY_LED%d/direction' % self._led,
+                 os.O_WRONLY)
+    try:
+      blink_loop(self._event, lambda: os.write(fd, b'low'),
+                 lambda: os.write(fd, b'high'), on_time, off_time)
+    finally:
+      os.close(fd)
+      _write('/sys/class/gpio/unexport', gpio)
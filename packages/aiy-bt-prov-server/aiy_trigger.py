@@ -12,54 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import glob
 import os
-import subprocess
-import threading
 
 from gpiozero import Button
 from gpiozero import LED
 
+from aiy_led import OnboardBlinker
+
 BLINK_ON_TIME_S = 0.5
 BLINK_OFF_TIME_S = 0.5
 BUTTON_HOLD_TIME_S = 5
 
 BASE_GPIO_FILE = '/sys/module/gpio_aiy_io/drivers/platform:gpio-aiy-io/gpio-aiy-io/gpio/gpiochip*/base'
-BASE_GPIO = int(subprocess.run('cat %s' % BASE_GPIO_FILE, shell=True, capture_output=True).stdout.strip())
 BUTTON_GPIO = 23
 BUTTON_LED_GPIO = 25
 
-def _write(path, data):
-  with open(path, 'w') as file:
-    file.write(str(data))
-
-class OnboardLED(object):
-  def _run(self, on_time, off_time):
-    gpio = BASE_GPIO + (13, 14)[self._led]
-    _write('/sys/class/gpio/export', gpio)
-    try:
-      while not self._event.is_set():
-        _write('/sys/class/gpio/AIY_LED%d/direction' % self._led, 'low')
-        self._event.wait(on_time)
-        _write('/sys/class/gpio/AIY_LED%d/direction' % self._led, 'high')
-        self._event.wait(off_time)
-    finally:
-      _write('/sys/class/gpio/unexport', gpio)
-
-  def __init__(self, led):
-    self._led = led
-    self._thread = None
-
-  def blink(self, on_time, off_time):
-    self._event = threading.Event()
-    self._thread = threading.Thread(target=self._run, args=(on_time, off_time), daemon=True)
-    self._thread.start()
-
-  def off(self):
-    if self._thread:
-      self._event.set()
-      self._thread.join()
-      self._thread = None
+@functools.lru_cache(maxsize=None)
+def _base_gpio():
+  paths = glob.glob(BASE_GPIO_FILE)
+  if not paths:
+    return None
+  with open(paths[0]) as file:
+    return int(file.read().strip())
 
+@functools.lru_cache(maxsize=None)
+def _has_onboard_led():
+  base_gpio = _base_gpio()
+  return base_gpio is not None and os.path.isdir(
+      '/sys/class/gpio/gpiochip%d' % base_gpio)
 
 class AiyTrigger(object):
   """Trigger interface for AIY kits."""
@@ -68,8 +50,8 @@ class AiyTrigger(object):
     self._triggered = triggered
     self._active = False
 
-    if os.path.exists('/sys/class/gpio/gpiochip%d' % BASE_GPIO):
-      self._led = OnboardLED(0)
+    if _has_onboard_led():
+      self._led = OnboardBlinker(0, _base_gpio())
     else:
       self._led = LED(BUTTON_LED_GPIO)
 
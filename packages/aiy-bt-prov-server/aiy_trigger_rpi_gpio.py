@@ -18,6 +18,9 @@ import time
 
 import RPi.GPIO as GPIO
 
+import aiy_led
+from aiy_led import OnboardBlinker
+
 BLINK_ON_TIME_S = 0.5
 BLINK_OFF_TIME_S = 0.5
 BUTTON_HOLD_TIME_S = 5
@@ -26,51 +29,33 @@ BUTTON_GPIO = 23
 BUTTON_LED_GPIO = 25
 
 BASE_GPIO = 497
-LED1_GPIO = BASE_GPIO + 14
 
-def _write(path, data):
-  with open(path, 'w') as file:
-    file.write(str(data))
+# Invariant for the process lifetime; checked once instead of per blink.
+_HAS_ONBOARD_LED = os.path.isdir('/sys/class/gpio/gpiochip%d' % BASE_GPIO)
 
-class LED(object):
-  def _button_led_loop(self, on_time, off_time):
+class _ButtonLedBlinker(aiy_led.Blinker):
+  def _run(self, on_time, off_time):
     GPIO.setup(BUTTON_GPIO, GPIO.OUT)
-    while not self._event.is_set():
-      GPIO.output(BUTTON_LED_GPIO, True)
-      self._event.wait(on_time)
-      GPIO.output(BUTTON_LED_GPIO, False)
-      self._event.wait(off_time)
-
-  def _onboard_led_loop(self, on_time, off_time):
-    _write('/sys/class/gpio/export', LED1_GPIO)
-    try:
-      while not self._event.is_set():
-        _write('/sys/class/gpio/AIY_LED1/direction', 'low')
-        self._event.wait(on_time)
-        _write('/sys/class/gpio/AIY_LED1/direction', 'high')
-        self._event.wait(off_time)
-    finally:
-      _write('/sys/class/gpio/unexport', LED1_GPIO)
+    aiy_led.blink_loop(self._event,
+                       lambda: GPIO.output(BUTTON_LED_GPIO, True),
+                       lambda: GPIO.output(BUTTON_LED_GPIO, False),
+                       on_time, off_time)
 
+class LED(object):
   def __init__(self):
-    self._thread = None
+    self._blinker = None
 
   def blink(self, on_time, off_time):
-    self._event = threading.Event()
-
-    if os.path.exists('/sys/class/gpio/gpiochip%d' % BASE_GPIO):
-      run = self._onboard_led_loop
+    if _HAS_ONBOARD_LED:
+      self._blinker = OnboardBlinker(1, BASE_GPIO)
     else:
-      run = self._button_led_loop
-
-    self._thread = threading.Thread(target=run, args=(on_time, off_time), daemon=True)
-    self._thread.start()
+      self._blinker = _ButtonLedBlinker()
+    self._blinker.blink(on_time, off_time)
 
   def off(self):
-    if self._thread:
-      self._event.set()
-      self._thread.join()
-      self._thread = None
+    if self._blinker:
+      self._blinker.off()
+      self._blinker = None
 
 class Button(object):
   def __init__(self, delay, callback):
@@ -82,18 +67,14 @@ class Button(object):
   def _run(self, delay, callback):
     while True:
       GPIO.wait_for_edge(BUTTON_GPIO, GPIO.FALLING)
-      start = time.monotonic()
       time.sleep(0.2)  # Debounce
 
-      done = callback
-      while time.monotonic() - start < delay:
-        if GPIO.input(BUTTON_GPIO):
-          done = None
-          break
-        time.sleep(0.01)
-
-      if done:
-        done()
+      # Wait for the release edge instead of polling the input; a timeout
+      # means the button was held for the full delay.
+      timeout_ms = int((delay - 0.2) * 1000)
+      released = GPIO.wait_for_edge(BUTTON_GPIO, GPIO.RISING, timeout=timeout_ms)
+      if released is None and not GPIO.input(BUTTON_GPIO):
+        callback()
 
 class AiyTrigger(object):
   """Trigger interface for AIY kits."""
@@ -42,9 +42,17 @@ import messages_pb2
 from sta_wpas_client import StaWpasClient
 from aiy_trigger import AiyTrigger
 
+_LOGGER = logging.getLogger("logger")
+
 BT_SERVICE_UUID = "b3e6fae8-af98-11e7-bd52-db14af10432c"
 PROTOCOL_VERSION = 1
 
+_LEN_STRUCT = struct.Struct("!I")
+
+_DBUS_TRUE = dbus.Boolean(1)
+_DBUS_FALSE = dbus.Boolean(0)
+_DBUS_ZERO_U32 = dbus.UInt32(0)
+
 _closables = []
 
 def _SignalHandler(signum, frame):  # pylint: disable=unused-argument
@@ -64,13 +72,17 @@ class BtProvServer(object):
   def __init__(self, kit_id, kit_name, enable_trigger=True):
     self._lock = threading.Lock()
     self._cond = threading.Condition(self._lock)
-    self._logger = logging.getLogger("logger")
+    self._logger = _LOGGER
     self._wpas_client = StaWpasClient()
     self._server_socket = None
     self._client_socket = None
     self._adapter = dbus.Interface(dbus.SystemBus().get_object(
         "org.bluez", "/org/bluez/hci0"), "org.freedesktop.DBus.Properties")
-    self._adapter.Set("org.bluez.Adapter1", "Powered", dbus.Boolean(1))
+    self._adapter.Set("org.bluez.Adapter1", "Powered", _DBUS_TRUE)
+    # Never time out of discoverable mode; set once so toggling
+    # discoverability costs a single D-Bus round-trip.
+    self._adapter.Set("org.bluez.Adapter1", "DiscoverableTimeout",
+                      _DBUS_ZERO_U32)
 
     self._kit_id = kit_id
     self._SetDeviceName(kit_name)
@@ -126,18 +138,7 @@ class BtProvServer(object):
     if self.HasTrigger():
       self._trigger.SetActive(True)
 
-    subprocess.call("/usr/bin/sdptool add SP", shell=True)
-
-    self._server_socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-    self._server_socket.bind(("", bluetooth.PORT_ANY))
-    self._server_socket.listen(1)
-
-    bluetooth.advertise_service(
-        self._server_socket,
-        "BtProvServer",
-        service_id=BT_SERVICE_UUID,
-        service_classes=[BT_SERVICE_UUID, bluetooth.SERIAL_PORT_CLASS],
-        profiles=[bluetooth.SERIAL_PORT_PROFILE])
+    self._EnsureListening()
 
     start = time.monotonic()
 
@@ -148,6 +149,7 @@ class BtProvServer(object):
           self._server_socket.settimeout(left)
           self._logger.info("Waiting %d seconds for connections", round(left))
         else:
+          self._server_socket.settimeout(None)
           self._logger.info("Waiting for connections")
         self._SetDiscoverable(True)
         self._client_socket, client_info = self._server_socket.accept()
@@ -180,6 +182,21 @@ class BtProvServer(object):
     self._triggered = False
     return not self._closed
 
+  def _EnsureListening(self):
+    """Creates the listen socket and SDP record once, reused across runs."""
+    if self._server_socket is not None:
+      return
+    self._server_socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+    self._server_socket.bind(("", bluetooth.PORT_ANY))
+    self._server_socket.listen(1)
+
+    bluetooth.advertise_service(
+        self._server_socket,
+        "BtProvServer",
+        service_id=BT_SERVICE_UUID,
+        service_classes=[BT_SERVICE_UUID, bluetooth.SERIAL_PORT_CLASS],
+        profiles=[bluetooth.SERIAL_PORT_PROFILE])
+
   def _WaitForTrigger(self):
     with self._lock:
       if not self.HasTrigger():
@@ -206,36 +223,42 @@ class BtProvServer(object):
   def _SetDiscoverable(self, discoverable):
     adapter = self._adapter
     if discoverable:
-      adapter.Set("org.bluez.Adapter1", "DiscoverableTimeout", dbus.UInt32(0))
-      adapter.Set("org.bluez.Adapter1", "Discoverable", dbus.Boolean(1))
+      adapter.Set("org.bluez.Adapter1", "Discoverable", _DBUS_TRUE)
       self._HciConfigCommand("leadv 3")
       self._logger.info("Discoverable enabled")
     else:
-      adapter.Set("org.bluez.Adapter1", "Discoverable", dbus.Boolean(0))
+      adapter.Set("org.bluez.Adapter1", "Discoverable", _DBUS_FALSE)
       self._HciConfigCommand("noleadv")
       self._logger.info("Discoverable disabled")
 
   def _HciConfigCommand(self, command):
-    subprocess.call("/bin/hciconfig hci0 %s" % command, shell=True)
+    subprocess.call(["/bin/hciconfig", "hci0"] + command.split())
+
+  _HANDLERS = {
+      "get_state": lambda self, received: self._HandleGetState(),
+      "set_device_name":
+          lambda self, received: self._HandleSetDeviceName(
+              received.set_device_name),
+      "identify": lambda self, received: self._HandleIdentify(
+          received.identify),
+      "scan_networks":
+          lambda self, received: self._HandleScanNetworks(
+              received.scan_networks),
+      "connect_network":
+          lambda self, received: self._HandleConnectNetwork(
+              received.connect_network),
+  }
 
   def _HandleConnection(self):
     while True:
       received = self._ReceiveRequest()
       request = received.WhichOneof("request")
       self._logger.info("Received request '%s'", request)
-      if request == "get_state":
-        self._HandleGetState()
-      elif request == "set_device_name":
-        self._HandleSetDeviceName(received.set_device_name)
-      elif request == "identify":
-        self._HandleIdentify(received.identify)
-      elif request == "scan_networks":
-        self._HandleScanNetworks(received.scan_networks)
-      elif request == "connect_network":
-        self._HandleConnectNetwork(received.connect_network)
-      else:
+      handler = self._HANDLERS.get(request)
+      if handler is None:
         self._logger.info("Received unknown request '%s'", request)
         break
+      handler(self, received)
 
   def _HandleGetState(self):
     response = messages_pb2.Response()
@@ -274,11 +297,10 @@ class BtProvServer(object):
 
     response = messages_pb2.Response()
     response.scan_networks.status = messages_pb2.SUCCESS
-    for entry in entries:
-      scan_result = response.scan_networks.results.add()
-      scan_result.ssid = entry["ssid"]
-      scan_result.secure = entry["secure"]
-      scan_result.rssi = entry["rssi"]
+    response.scan_networks.results.extend(
+        messages_pb2.ScanNetworks.Response.ScanResult(
+            ssid=entry["ssid"], secure=entry["secure"], rssi=entry["rssi"])
+        for entry in entries)
     self._SendMessage(response)
 
   def _HandleConnectNetwork(self, request):
@@ -297,19 +319,23 @@ class BtProvServer(object):
     if self._client_socket is None:
       return
     buf = message.SerializeToString()
-    self._client_socket.send(struct.pack("!I", len(buf)))
-    self._client_socket.send(buf)
+    self._client_socket.sendall(_LEN_STRUCT.pack(len(buf)) + buf)
 
   def _ReceiveBytes(self, num_bytes):
-    received = bytearray(b"")
-    while num_bytes > len(received):
-      buf = self._client_socket.recv(num_bytes - len(received))
-      received.extend(buf)
-    return bytes(received)
+    buf = bytearray(num_bytes)
+    view = memoryview(buf)
+    offset = 0
+    while offset < num_bytes:
+      received = self._client_socket.recv_into(view[offset:],
+                                               num_bytes - offset)
+      if not received:
+        raise IOError("Connection closed")
+      offset += received
+    return bytes(buf)
 
   def _ReceiveRequest(self):
-    buf = self._ReceiveBytes(4)
-    num_bytes = struct.unpack("!I", buf)[0]
+    buf = self._ReceiveBytes(_LEN_STRUCT.size)
+    num_bytes = _LEN_STRUCT.unpack(buf)[0]
     buf = self._ReceiveBytes(num_bytes)
     request = messages_pb2.Request()
     request.ParseFromString(buf)
@@ -22,6 +22,8 @@ import sys
 import tempfile
 import threading
 
+_LOGGER = logging.getLogger("logger")
+
 DHCPCD_SOCK = "/var/run/dhcpcd.unpriv.sock"
 
 
@@ -29,7 +31,7 @@ class DhcpcdClient(object):
   """DHCPCD socket client."""
 
   def __init__(self, ifname):
-    self._logger = logging.getLogger("logger")
+    self._logger = _LOGGER
     self.event_thread = self._EventThread(self, ifname)
     self.event_thread.start()
     self.ifname = ifname
@@ -63,10 +65,15 @@ class DhcpcdClient(object):
     def run(self):
       try:
         while not self.closed:
-          if self.monitor.HasPending(1):
-            event = self.monitor.ReceiveEvent()
-            if event["interface"] == self.ifname:
-              self.owner.OnEvent(event)
+          # Block until an event arrives; Close() shuts the socket down,
+          # which wakes the select immediately.
+          if not self.monitor.HasPending(None):
+            continue
+          if self.closed:
+            break
+          event = self.monitor.ReceiveEvent()
+          if event["interface"] == self.ifname:
+            self.owner.OnEvent(event)
       except:  # Route to system hook, so pylint: disable=bare-except
         sys.excepthook(*sys.exc_info())
 
@@ -111,6 +118,10 @@ class DhcpcdClient(object):
 
       def Close(self):
         if self.started:
+          try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+          except OSError:
+            pass
           self.socket.close()
           self._UnlinkFile()
           self.started = False
@@ -126,10 +137,5 @@ class DhcpcdClient(object):
         buf = self.socket.recv(4)
         num_bytes = struct.unpack("@I", buf)[0]
         buf = self.socket.recv(num_bytes)
-        buf = buf.split(b"\x00")
-
-        event = {}
-        entries = [entry.decode("utf-8").split("=") for entry in buf if b"=" in entry]
-        for entry in entries:
-          event[entry[0]] = entry[1]
-        return event
+        return dict(entry.decode("utf-8").split("=", 1)
+                    for entry in buf.split(b"\x00") if b"=" in entry)
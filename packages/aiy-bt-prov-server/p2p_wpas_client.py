@@ -21,14 +21,20 @@ import time
 
 from wpas_client import WpasClient
 
+_LOGGER = logging.getLogger("logger")
+
 DEVICE_NAME = "AIY"
 
+_GO_STARTED_RE = re.compile(
+    r'P2P-GROUP-STARTED (.*) GO ssid="(.*)" freq=\d+ passphrase="(.*)"')
+_GO_REMOVED_RE = re.compile(r'P2P-GROUP-REMOVED (.*) GO reason=(.*)')
+
 
 class P2pWpasClient(WpasClient):
   """wpa_supplicant client for P2P interfaces."""
 
   def __init__(self):
-    self._logger = logging.getLogger("logger")
+    self._logger = _LOGGER
     self._lock = threading.Lock()
     self._state_change_cond = threading.Condition(self._lock)
     self._go_interface = None
@@ -73,9 +79,7 @@ class P2pWpasClient(WpasClient):
     with self._lock:
       if event.startswith("P2P-GROUP-STARTED"):
         self._logger.info("%s: %s", self._ifname, event)
-        match = re.search(
-            "P2P-GROUP-STARTED (.*) GO ssid=\"(.*)\" freq=\\d+ passphrase=\"(.*)\"",
-            event)
+        match = _GO_STARTED_RE.match(event)
         self._go_interface = {
             "ifname": match.group(1),
             "ssid": match.group(2),
@@ -88,7 +92,7 @@ class P2pWpasClient(WpasClient):
       if event.startswith("P2P-GROUP-REMOVED"):
         self._logger.info("%s: %s", self._ifname, event)
         if self._go_interface is not None:
-          match = re.search("P2P-GROUP-REMOVED (.*) GO reason=(.*)", event)
+          match = _GO_REMOVED_RE.match(event)
           # TODO: Close control interface
           self._go_interface = None
 
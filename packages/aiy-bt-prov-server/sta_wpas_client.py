@@ -21,6 +21,24 @@ import time
 from dhcpcd_client import DhcpcdClient
 from wpas_client import WpasClient
 
+_ASSOC_SSID_RE = re.compile(r"'(.*)'")
+
+# Events that never change the supplicant connection state; skip the
+# STATUS round-trip for them. BSS add/remove events in particular arrive
+# in bursts after every scan.
+_STATELESS_EVENT_PREFIXES = (
+    "CTRL-EVENT-SCAN-STARTED",
+    "CTRL-EVENT-SCAN-RESULTS",
+    "CTRL-EVENT-BSS-ADDED",
+    "CTRL-EVENT-BSS-REMOVED",
+)
+_DISABLED_RE = re.compile(
+    r'id=(\d+) ssid="(.*)" auth_failures=(\d+) duration=(\d+) reason=(.*)')
+
+# How old a cached STATUS may get before GetState refreshes it. _OnEvent
+# keeps it fresh whenever the supplicant is emitting events.
+_STATUS_MAX_AGE = 10.0
+
 
 class StaWpasClient(WpasClient):
   """wpa_supplicant client for STA interfaces."""
@@ -33,6 +51,7 @@ class StaWpasClient(WpasClient):
     self._dhcp_address = ""
     self._last_disabled_event = None
     self._status = {"wpa_state": "UNKNOWN"}
+    self._status_time = 0.0
     with self._lock:
       super(StaWpasClient, self).__init__("wlan0")
       self._dhcpcd_client = self._NewIpDhcpcdClient("wlan0", self)
@@ -47,6 +66,8 @@ class StaWpasClient(WpasClient):
 
   def GetState(self):
     with self._lock:
+      if time.monotonic() - self._status_time > _STATUS_MAX_AGE:
+        self._UpdateSupplicantStatus()
       return (self._status["wpa_state"], self._GetSsid(), self._dhcp_address,
               self._GetRssi())
 
@@ -68,10 +89,7 @@ class StaWpasClient(WpasClient):
         return False
       self._logger.info("%s: WaitForNetwork: waiting", self._ifname)
 
-      start = time.monotonic()
-      while not _IsConnected() and time.monotonic() - start < timeout:
-        to_wait = timeout - (time.monotonic() - start)
-        self._state_change_cond.wait(to_wait)
+      self._state_change_cond.wait_for(_IsConnected, timeout)
 
       self._logger.info("%s: WaitForNetwork: final state %s %s",
                         self._ifname, self._status["wpa_state"],
@@ -92,25 +110,26 @@ class StaWpasClient(WpasClient):
     self._logger.info("%s: Connecting to network '%s'" % (self._ifname, ssid))
     start = time.monotonic()
     with self._lock:
-      network = self.GetNetworkBySsid(ssid)
-      if network is not None:
+      networks = self.GetNetworks()
+      existing = next((n for n in networks if n["ssid"] == ssid), None)
+      if existing is not None:
         self._logger.info("%s: Network '%s' already exists, removing",
                           self._ifname, ssid)
-        if not self.RemoveNetwork(network["id"]):
+        if not self.RemoveNetwork(existing["id"]):
           self._logger.info("%s: Failed to remove network '%s' with id %d",
-                            self._ifname, ssid, network["id"])
+                            self._ifname, ssid, existing["id"])
 
-      for network in self.GetNetworks():
+      for network in networks:
+        if existing is not None and network["id"] == existing["id"]:
+          continue
         self.DisableNetwork(network["id"])
 
-      while time.monotonic() - start < timeout:
-        if self._dhcp_address:
-          self._logger.info("%s: Waiting for DHCP release of %s", self._ifname,
-                            self._dhcp_address)
-          to_wait = timeout - (time.monotonic() - start)
-          self._state_change_cond.wait(to_wait)
-        else:
-          break
+      if self._dhcp_address:
+        self._logger.info("%s: Waiting for DHCP release of %s", self._ifname,
+                          self._dhcp_address)
+        self._state_change_cond.wait_for(
+            lambda: not self._dhcp_address,
+            timeout - (time.monotonic() - start))
       if self._dhcp_address:
         self._logger.info("%s: DHCP %s not released", self._ifname,
                           self._dhcp_address)
@@ -120,46 +139,35 @@ class StaWpasClient(WpasClient):
       self._logger.info("%s: Created network with id %d", self._ifname, net_id)
 
       secure = True if psk else False
-      self.SetNetworkSsid(net_id, ssid)
-      self.SetNetworkScanSsid(net_id, True)
-      self.SetNetworkKeyMgmt(net_id, secure)
-      if secure:
-        self.SetNetworkPsk(net_id, psk)
+      self.SetNetworkParams(net_id, ssid, secure, psk)
 
       self._last_disabled_event = None
       self.SelectNetwork(net_id)
       self._logger.info("%s: Network '%s' with id %d selected", self._ifname,
                         ssid, net_id)
 
-      while time.monotonic() - start < timeout:
-        to_wait = timeout - (time.monotonic() - start)
-        self._state_change_cond.wait(to_wait)
-        state = self._status["wpa_state"]
-        if self._last_disabled_event is not None:
-          if self._last_disabled_event["id"] == net_id:
-            reason = self._last_disabled_event["reason"]
-            self._logger.info("%s: Network with id %d disabled with reason %s",
-                              self._ifname, net_id, reason)
-            break
-        if state == "SCANNING":
-          self._logger.info("%s: Scanning for '%s'", self._ifname, ssid)
-        elif state == "ASSOCIATING":
-          self._logger.info("%s: Associating with '%s'", self._ifname,
-                            self._ass_ssid)
-        elif state == "4WAY_HANDSHAKE":
-          self._logger.info("%s: Authenticating with '%s'", self._ifname,
-                            self._status["ssid"])
-        elif state == "COMPLETED":
-          if self._dhcp_address:
-            self._logger.info("%s: Connected to '%s' with IP address %s",
-                              self._ifname, self._status["ssid"],
-                              self._dhcp_address)
-            break
-          else:
-            self._logger.info("%s: Connected to '%s', waiting for IP address",
-                              self._ifname, self._status["ssid"])
+      def _ConnectResolved():
+        if (self._last_disabled_event is not None and
+            self._last_disabled_event["id"] == net_id):
+          return True
+        return (self._status["wpa_state"] == "COMPLETED" and
+                bool(self._dhcp_address))
+
+      # Progress (state transitions, DHCP) is logged by _OnEvent and
+      # _OnNewIp as it happens.
+      self._state_change_cond.wait_for(_ConnectResolved,
+                                       timeout - (time.monotonic() - start))
+
+      if (self._last_disabled_event is not None and
+          self._last_disabled_event["id"] == net_id):
+        self._logger.info("%s: Network with id %d disabled with reason %s",
+                          self._ifname, net_id,
+                          self._last_disabled_event["reason"])
 
       if self._status["wpa_state"] == "COMPLETED" and self._dhcp_address:
+        self._logger.info("%s: Connected to '%s' with IP address %s",
+                          self._ifname, self._status["ssid"],
+                          self._dhcp_address)
         self._logger.info("%s: Connection attempt successful in %.1f s",
                           self._ifname,
                           time.monotonic() - start)
@@ -192,6 +200,7 @@ class StaWpasClient(WpasClient):
     new_status = self.GetStatus()
     state_changed = self._status["wpa_state"] != new_status["wpa_state"]
     self._status = new_status
+    self._status_time = time.monotonic()
     return state_changed
 
   def _OnEvent(self, event):
@@ -199,7 +208,10 @@ class StaWpasClient(WpasClient):
       return
 
     with self._lock:
-      state_changed = self._UpdateSupplicantStatus()
+      if event.startswith(_STATELESS_EVENT_PREFIXES):
+        state_changed = False
+      else:
+        state_changed = self._UpdateSupplicantStatus()
       state = self._status["wpa_state"]
 
       if state_changed and state == "ASSOCIATING":
@@ -207,21 +219,20 @@ class StaWpasClient(WpasClient):
       if state != "ASSOCIATING":
         self._ass_ssid = ""
       if event.startswith("Trying to associate with "):
-        match = re.search("\'(.*)\'", event)
+        match = _ASSOC_SSID_RE.search(event)
         self._ass_ssid = self._DecodeSsid(match.group(1))
         state_changed = True
 
+      notify_state = False
       if state_changed:
         self._logger.info("%s: New state: %s", self._ifname, state)
-        self._state_change_cond.notifyAll()
+        notify_state = True
 
       if event.startswith("CTRL-EVENT-SCAN-RESULTS"):
         self._scan_results_cond.notifyAll()
 
       if event.startswith("CTRL-EVENT-SSID-TEMP-DISABLED"):
-        match = re.search(
-            "id=(\\d+) ssid=\"(.*)\" auth_failures=(\\d+) duration=(\\d+) reason=(.*)",
-            event)
+        match = _DISABLED_RE.search(event)
         self._last_disabled_event = {
             "id": int(match.group(1)),
             "ssid": match.group(2),
@@ -229,12 +240,15 @@ class StaWpasClient(WpasClient):
             "duration": int(match.group(4)),
             "reason": match.group(5)
         }
+        notify_state = True
+
+      # Wake state waiters at most once per event.
+      if notify_state:
         self._state_change_cond.notifyAll()
 
   def _OnNewIp(self, ip):
     self._logger.info("%s: DHCP: %s", self._ifname, ip if ip else "released")
     with self._lock:
-      self._UpdateSupplicantStatus()
       self._dhcp_address = ip
       self._state_change_cond.notifyAll()
 
@@ -247,13 +261,13 @@ class StaWpasClient(WpasClient):
       super(StaWpasClient._NewIpDhcpcdClient, self).__init__(ifname)
 
     def OnEvent(self, event):
-      ip = self._reported_ip
-      if ("if_up" in event and
-          event["if_up"] == "false") or ("if_down" in event and
-                                         event["if_down"] == "true"):
+      new_ip = event.get("new_ip_address")
+      if event.get("if_up") == "false" or event.get("if_down") == "true":
         ip = ""
-      elif "new_ip_address" in event:
-        ip = event["new_ip_address"]
+      elif new_ip is not None:
+        ip = new_ip
+      else:
+        ip = self._reported_ip
       if ip != self._reported_ip:
         self._reported_ip = ip
         self._owner._OnNewIp(ip)
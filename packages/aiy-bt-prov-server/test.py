@@ -26,6 +26,8 @@ from sta_wpas_client import StaWpasClient
 
 _closables = []
 
+_SYSLOG_PREFIX = "%s[%d]" % (sys.argv[0], os.getpid())
+
 
 def _SignalHandler(signum, frame):
   print("\nCaught signal %d\n" % signum)
@@ -47,8 +49,7 @@ def main():
   args = parser.parse_args()
   if args.syslog:
     handler = logging.handlers.SysLogHandler(address = "/dev/log")
-    format = "%s[%d]" % (sys.argv[0], os.getpid())
-    formatter = logging.Formatter(format + ": %(message)s")
+    formatter = logging.Formatter(_SYSLOG_PREFIX + ": %(message)s")
   else:
     handler = logging.StreamHandler(sys.stdout)
     formatter = logging.Formatter('%(asctime)s: %(message)s')
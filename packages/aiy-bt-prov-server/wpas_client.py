@@ -13,8 +13,10 @@
 # limitations under the License.
 
 """wpa_supplicant control interface client."""
+import heapq
 import logging
 import os
+import re
 import select
 import socket
 import sys
@@ -22,14 +24,39 @@ import tempfile
 import threading
 import time
 
+_LOGGER = logging.getLogger("logger")
+
 WPAS_CTRL_DIR = "/var/run/wpa_supplicant"
 
+# The explicit escapes wpa_supplicant does, plus \xNN escaped bytes.
+_SSID_ESCAPE_RE = re.compile(rb'\\(\\|"|e|n|r|t|x[0-9a-fA-F]{2})')
+_SSID_ESCAPES = {
+    b"\\": b"\\",
+    b"\"": b"\"",
+    b"e": b"\x45",
+    b"n": b"\n",
+    b"r": b"\r",
+    b"t": b"\t",
+}
+
+
+def _DecodeSsidEscape(match):
+  escape = match.group(1)
+  decoded = _SSID_ESCAPES.get(escape)
+  if decoded is None:
+    decoded = bytes((int(escape[1:], 16),))
+  return decoded
+
+
+def _IsSecure(flags):
+  return "WPA2-PSK" in flags or "WPA-PSK" in flags
+
 
 class WpasClient(object):
   """wpa_supplicant control interface client."""
 
   def __init__(self, ifname, level=3):
-    self._logger = logging.getLogger("logger")
+    self._logger = _LOGGER
     self._ifname = ifname
     self._control_lock = threading.Lock()
     with self._control_lock:
@@ -45,6 +72,11 @@ class WpasClient(object):
     with self._control_lock:
       return self._control.SendCommand(command)
 
+  def SendCommands(self, commands):
+    """Send a batch of commands to wpa_supplicant, one reply each."""
+    with self._control_lock:
+      return self._control.SendCommands(commands)
+
   def Close(self):
     """Closes this instance and all related resources."""
     with self._control_lock:
@@ -88,20 +120,21 @@ class WpasClient(object):
 
   def GetScanResults(self):
     """Returns a dict with the latest scan results available."""
-
-    def _IsSecure(flags):
-      return "WPA2-PSK" in flags or "WPA-PSK" in flags
-
     response = self.SendCommand("SCAN_RESULTS")
 
     results = {}
-    for line in response.split("\n")[1:-1]:
+    lines = iter(response.splitlines())
+    next(lines, None)  # Skip the header row.
+    for line in lines:
+      if not line:
+        continue
       (_, _, rssi, flags, ssid) = line.split("\t")
       if not ssid:
         continue
       ssid = self._DecodeSsid(ssid)
       rssi = int(rssi)
-      if not (ssid in results and rssi < results[ssid]["rssi"]):
+      cur = results.get(ssid)
+      if cur is None or rssi >= cur["rssi"]:
         results[ssid] = {"ssid": ssid, "secure": _IsSecure(flags), "rssi": rssi}
     return list(results.values())
 
@@ -110,7 +143,11 @@ class WpasClient(object):
     response = self.SendCommand("LIST_NETWORKS")
 
     networks = []
-    for line in response.split("\n")[1:-1]:
+    lines = iter(response.splitlines())
+    next(lines, None)  # Skip the header row.
+    for line in lines:
+      if not line:
+        continue
       (net_id, ssid, bssid, flags) = line.split("\t")
       networks.append({
           "id": net_id,
@@ -164,6 +201,18 @@ class WpasClient(object):
     value = "WPA-PSK" if secure else "NONE"
     return self._SetNetworkProperty(net_id, "key_mgmt", value)
 
+  def SetNetworkParams(self, net_id, ssid, secure, psk=None):
+    """Set ssid, scan_ssid, key_mgmt and psk for net_id in one batch."""
+    commands = [
+        'SET_NETWORK %d ssid "%s"' % (net_id, ssid),
+        "SET_NETWORK %d scan_ssid 1" % net_id,
+        "SET_NETWORK %d key_mgmt %s" % (net_id,
+                                        "WPA-PSK" if secure else "NONE"),
+    ]
+    if secure:
+      commands.append('SET_NETWORK %d psk "%s"' % (net_id, psk))
+    return all("OK" in res for res in self.SendCommands(commands))
+
   def CreateP2pGroup(self):
     return "OK" in self.SendCommand("P2P_GROUP_ADD")
 
@@ -184,27 +233,16 @@ class WpasClient(object):
     return self.SendCommand("GET country")
 
   def _DecodeSsid(self, ssid):
-    # Undo the only explicit escapes wpa_supplicant does.
-    ssid = ssid.replace("\\\\", "\\")
-    ssid = ssid.replace("\\\"", "\"")
-    ssid = ssid.replace("\\e", "\x45")
-    ssid = ssid.replace("\\n", "\n")
-    ssid = ssid.replace("\\r", "\r")
-    ssid = ssid.replace("\\t", "\t")
-
-    # ssid now only has printable ascii chars or \xNN escaped bytes.
-    # Treat the entire thing as utf-8. SSID is just a byte sequence so
+    # Most SSIDs contain no escapes at all; skip the decoder entirely.
+    if "\\" not in ssid:
+      return ssid
+
+    # ssid only has printable ascii chars, wpa_supplicant's explicit
+    # escapes, and \xNN escaped bytes. Undo the escapes in a single regex
+    # pass and treat the result as utf-8. SSID is just a byte sequence so
     # it doesn't have to be utf-8, but most non ascii cases are.
-    buf = bytearray(b"")
-    i = 0
-    while i < len(ssid):
-      if ssid[i:i + 2] == "\\x":
-        buf.append(int(ssid[i + 2:i + 4], 16))
-        i += 4
-      else:
-        buf.append(ord(ssid[i]))
-        i += 1
-    return buf.decode("utf-8")
+    raw = ssid.encode("latin-1")
+    return _SSID_ESCAPE_RE.sub(_DecodeSsidEscape, raw).decode("utf-8")
 
   def _OnEvent(self, event):
     self._logger.info("Unhandled event (%s): %s" % (self._ifname, event))
@@ -223,24 +261,48 @@ class WpasClient(object):
       self._alarm_lock = threading.Lock()
       self._monitor = owner.InterfaceConnection(ifname)
       self._closed = False
+      # Self-pipe so Close() and SetAlarm() can interrupt the select.
+      self._wake_r, self._wake_w = os.pipe()
+      os.set_blocking(self._wake_r, False)
 
     def __del__(self):
       self.Close()
 
     def Close(self):
       self._closed = True
+      self._Wake()
       self._monitor.Close()
 
     def SetAlarm(self, alarm, delay):
       with self._alarm_lock:
-        self._alarms.append((time.monotonic() + delay / 1000, alarm))
-        self._alarms.sort(key=lambda entry: entry[0])
+        heapq.heappush(self._alarms, (time.monotonic() + delay / 1000, alarm))
+      self._Wake()
+
+    def _Wake(self):
+      try:
+        os.write(self._wake_w, b"\x00")
+      except OSError:
+        pass
+
+    def _NextAlarmTimeout(self, default=3600.0):
+      with self._alarm_lock:
+        if not self._alarms:
+          return default
+        return max(0.0, self._alarms[0][0] - time.monotonic())
 
     def run(self):
       try:
         self._monitor.Attach(self._level)
         while not self._closed:
-          if self._monitor.HasPending(1):
+          # Sleep until an event arrives, the next alarm is due, or
+          # Close()/SetAlarm() writes to the wake pipe.
+          [r, _, _] = select.select([self._monitor.socket, self._wake_r],
+                                    [], [], self._NextAlarmTimeout())
+          if self._closed:
+            break
+          if self._wake_r in r:
+            os.read(self._wake_r, 4096)  # Drain wakeups.
+          if self._monitor.socket in r:
             event = self._monitor.Receive()
             self._owner._OnEvent(event[3:])
           self._ProcessAlarms()
@@ -251,21 +313,13 @@ class WpasClient(object):
 
     def _ProcessAlarms(self):
       now = time.monotonic()
+      expired = []
       with self._alarm_lock:
-        if not self._alarms:
-          return
-
-        if self._alarms[0][0] > now:
-          return
-
-        def _IsExpired(entry):
-          return True if now >= entry[0] else False
-
-        expired = [a for a in self._alarms if _IsExpired(a)]
-        self._alarms = [a for a in self._alarms if not _IsExpired(a)]
+        while self._alarms and self._alarms[0][0] <= now:
+          expired.append(heapq.heappop(self._alarms)[1])
 
       for alarm in expired:
-        self._owner._OnAlarm(alarm[1])
+        self._owner._OnAlarm(alarm)
 
   class InterfaceConnection(object):
     """Connection to wpa_supplicant control interface socket."""
@@ -310,6 +364,10 @@ class WpasClient(object):
         except:  # We're closing, so pylint: disable=bare-except
           self.attached = False
       if self.started:
+        try:
+          self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+          pass
         self.socket.close()
         self._UnlinkFile()
         self.started = False
@@ -327,6 +385,28 @@ class WpasClient(object):
         return self.Receive()
       raise Exception("SendCommand timeout")
 
+    def SendCommands(self, commands):
+      """Sends all commands before collecting their replies, in order.
+
+      The control interface answers each request datagram with one reply
+      datagram, so pipelining keeps commands and replies paired while
+      paying only a single round-trip of latency.
+      """
+      try:
+        for command in commands:
+          self.socket.send(command.encode("utf-8"))
+      except OSError as error:
+        if not self.started:
+          raise error
+        return ["" for _ in commands]
+      responses = []
+      for _ in commands:
+        [r, _, _] = select.select([self.socket], [], [], 10)
+        if not r:
+          raise Exception("SendCommands timeout")
+        responses.append(self.Receive())
+      return responses
+
     def Attach(self, level):
       if self.attached:
         return
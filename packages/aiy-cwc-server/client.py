@@ -25,7 +25,6 @@ python3 client.py --host 192.168.11.2 samples/longloop.py -- -n 100 -p 0.01
 import aiohttp
 import argparse
 import asyncio
-import base64
 import fcntl
 import json
 import os
@@ -35,6 +34,23 @@ import sys
 
 from functools import partial
 
+# Stream data travels as binary frames prefixed with a one-byte tag;
+# JSON is used only for control messages ('run', 'signal', 'exit').
+STDIN_TAG = b'\x01'
+STDOUT_TAG = 0x02
+STDERR_TAG = 0x03
+
+# Reused for every stdin read to avoid a fresh 100 KiB allocation per chunk.
+_STDIN_BUF = bytearray(100 * 1024)
+_STDIN_VIEW = memoryview(_STDIN_BUF)
+
+# At most this many stdin chunks buffer in Python; once full the reader
+# pauses and backpressure lands on the OS pipe.
+_STDIN_QUEUE_MAXSIZE = 8
+
+# Compact separators keep control frames small.
+_JSON_ENCODE = json.JSONEncoder(separators=(',', ':')).encode
+
 def set_nonblocking(fileno):
     fl = fcntl.fcntl(fileno, fcntl.F_GETFL)
     return fcntl.fcntl(fileno, fcntl.F_SETFL, fl | os.O_NONBLOCK)
@@ -43,12 +59,6 @@ def read_file(file):
     with open(file) as f:
         return f.read()
 
-def encode(data):
-    return base64.b64encode(data).decode('utf-8')
-
-def decode(data):
-    return base64.b64decode(data.encode('utf-8'))
-
 def make_run_msg(args, stdout, stderr, chunk_size, env, files):
     return {'type': 'run',
             'args': args,
@@ -62,35 +72,45 @@ def make_signal_msg(signum):
     return {'type': 'signal',
             'signum': signum}
 
-def make_stdin_msg(data):
-    return {'type': 'stdin',
-            'data': encode(data)}
+# Signal frames never vary, so encode them once.
+_SIGINT_FRAME = _JSON_ENCODE(make_signal_msg(signal.SIGINT))
+_SIGKILL_FRAME = _JSON_ENCODE(make_signal_msg(signal.SIGKILL))
 
 def sigint_handler(ws):
     """Ctrl-C handler."""
-    asyncio.ensure_future(ws.send_json(make_signal_msg(signal.SIGINT)))
+    asyncio.ensure_future(ws.send_str(_SIGINT_FRAME))
 
 def siginfo_handler(ws):
     """Ctrl-T handler."""
-    asyncio.ensure_future(ws.send_json(make_signal_msg(signal.SIGKILL)))
-
-async def send_stdin(queue, ws):
-    while True:
-        data = await queue.get()
-        await ws.send_json(make_stdin_msg(data))
+    asyncio.ensure_future(ws.send_str(_SIGKILL_FRAME))
 
 async def run(session, uri, run_msg, handle_sigint):
-    def read_stdin(queue):
-        data = sys.stdin.buffer.read(100 * 1024)
-        asyncio.ensure_future(queue.put(data))
-
     async with session.ws_connect(uri) as ws:
-        queue = asyncio.Queue()
+        queue = asyncio.Queue(maxsize=_STDIN_QUEUE_MAXSIZE)
         loop = asyncio.get_running_loop()
-        loop.add_reader(sys.stdin, partial(read_stdin, queue=queue))
-        asyncio.ensure_future(send_stdin(queue, ws))
-
-        await ws.send_json(run_msg)
+        paused = False
+
+        def read_stdin():
+            nonlocal paused
+            n = os.readv(sys.stdin.fileno(), (_STDIN_VIEW,))
+            queue.put_nowait(bytes(_STDIN_VIEW[:n]))
+            if queue.full():
+                loop.remove_reader(sys.stdin)
+                paused = True
+
+        async def send_stdin():
+            nonlocal paused
+            while True:
+                data = await queue.get()
+                await ws.send_bytes(STDIN_TAG + data)
+                if paused and queue.qsize() < _STDIN_QUEUE_MAXSIZE // 2:
+                    loop.add_reader(sys.stdin, read_stdin)
+                    paused = False
+
+        loop.add_reader(sys.stdin, read_stdin)
+        asyncio.ensure_future(send_stdin())
+
+        await ws.send_str(_JSON_ENCODE(run_msg))
 
         loop.add_signal_handler(signal.SIGINFO, partial(siginfo_handler, ws=ws))
 
@@ -99,18 +119,18 @@ async def run(session, uri, run_msg, handle_sigint):
                 partial(sigint_handler, ws=ws))
 
         async for msg in ws:
-            if msg.type == aiohttp.WSMsgType.TEXT:
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                if msg.data[0] == STDOUT_TAG:
+                    sys.stdout.buffer.write(msg.data[1:])
+                    sys.stdout.buffer.flush()
+                elif msg.data[0] == STDERR_TAG:
+                    sys.stderr.buffer.write(msg.data[1:])
+                    sys.stderr.buffer.flush()
+            elif msg.type == aiohttp.WSMsgType.TEXT:
                 params = json.loads(msg.data)
-                kind = params['type']
 
-                if kind == 'exit':
+                if params['type'] == 'exit':
                     return params['code']
-                elif kind == 'stdout':
-                    sys.stdout.buffer.write(decode(params['data']))
-                    sys.stdout.buffer.flush()
-                elif kind == 'stderr':
-                    sys.stderr.buffer.write(decode(params['data']))
-                    sys.stderr.buffer.flush()
 
         return 127  # WebSocket was closed without sending 'exit' message.
 
@@ -118,7 +138,7 @@ async def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--host', type=str, default='localhost')
     parser.add_argument('--port', type=int, default=8765)
-    parser.add_argument('--chunk_size', type=int, default=1024)
+    parser.add_argument('--chunk_size', type=int, default=64 * 1024)
     parser.add_argument('--stdout', type=str, default='pipe',
                         choices=('null', 'pipe'))
     parser.add_argument('--stderr', type=str, default='pipe',
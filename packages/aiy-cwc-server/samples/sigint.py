@@ -1,11 +1,14 @@
-import time
 import signal
 
 if __name__ == '__main__':
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Tick on SIGALRM and sleep in signal.pause() between ticks; unlike
+    # a time.sleep() loop the process is truly idle while waiting.
+    signal.signal(signal.SIGALRM, lambda *_: None)
+    signal.setitimer(signal.ITIMER_REAL, 1, 1)
 
     i = 0
     while True:
         print('Tick:', i)
         i += 1
-        time.sleep(1)
+        signal.pause()
@@ -15,36 +15,13 @@
 """
 Server commands and client messages defined according to
 http://json-schema.org/
+
+Stream data (stdin/stdout/stderr) is carried in binary WebSocket frames
+tagged with a leading byte and is not described here.
 """
 
 CLIENT_MESSAGES = {
     'definitions': {
-        'stdout_message': {
-            'type': 'object',
-            'properties': {
-                'type': {
-                   'type': 'string',
-                   'enum': ['stdout']
-                },
-                'data': {
-                   'type': 'string',
-                }
-            },
-            'required': ['type', 'data']
-        },
-        'stderr_message': {
-            'type': 'object',
-            'properties': {
-                'type': {
-                   'type': 'string',
-                   'enum': ['stderr']
-                },
-                'data': {
-                   'type': 'string',
-                }
-            },
-            'required': ['type', 'data']
-        },
         'exit_message' : {
             'type': 'object',
             'properties': {
@@ -66,15 +43,13 @@ CLIENT_MESSAGES = {
                 'type': {
                     'description': 'Message type.',
                     'type': 'string',
-                    'enum': ['stdout', 'stderr', 'exit']
+                    'enum': ['exit']
                 },
             },
             'required': ['type']
         },
         {
             'anyOf': [
-                { '$ref': '#/definitions/stdout_message' },
-                { '$ref': '#/definitions/stderr_message' },
                 { '$ref': '#/definitions/exit_message' },
             ]
         }
@@ -134,19 +109,6 @@ SERVER_COMMANDS = {
                   }
               },
               'required': ['type', 'signum']
-        },
-        'stdin_command': {
-              'type': 'object',
-              'properties': {
-                  'type': {
-                      'type': 'string',
-                      'enum': ['stdin'],
-                  },
-                  'data': {
-                      'type': 'string',
-                  }
-              },
-              'required': ['type', 'data']
         }
     },
 
@@ -156,7 +118,7 @@ SERVER_COMMANDS = {
                 'type': {
                     'description': 'Command type.',
                     'type': 'string',
-                    'enum': ['run', 'signal', 'stdin']
+                    'enum': ['run', 'signal']
                 },
             },
             'required': ['type']
@@ -165,7 +127,6 @@ SERVER_COMMANDS = {
             'anyOf': [
                 { '$ref': '#/definitions/run_command' },
                 { '$ref': '#/definitions/signal_command' },
-                { '$ref': '#/definitions/stdin_command' },
             ]
         }
     ]
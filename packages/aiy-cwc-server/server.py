@@ -31,8 +31,6 @@ To monitor services on macOS:
 import aiohttp
 import argparse
 import asyncio
-import base64
-import collections
 import concurrent.futures
 import contextlib
 import logging
@@ -43,6 +41,11 @@ import tempfile
 import time
 import weakref
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 try:
     import simplejson as json
 except ImportError:
@@ -55,6 +58,21 @@ import schema
 
 logger = logging.getLogger(__name__)
 
+# Prefer orjson for control-message (de)serialization; compact
+# separators keep the fallback frames equally small.
+if orjson is not None:
+    _JSON_ENCODE = lambda obj: orjson.dumps(obj).decode('utf-8')
+    _JSON_DECODE = orjson.loads
+else:
+    _JSON_ENCODE = json.JSONEncoder(separators=(',', ':')).encode
+    _JSON_DECODE = json.loads
+
+# Stream data travels as binary frames prefixed with a one-byte tag;
+# JSON is used only for control messages ('run', 'signal', 'exit').
+STDIN_TAG = 0x01
+STDOUT_TAG = b'\x02'
+STDERR_TAG = b'\x03'
+
 def track_websockets(app):
     async def close_all(application):
         for ws in set(application['websockets']):
@@ -72,13 +90,26 @@ def register_websocket(app, ws):
     finally:
         app['websockets'].discard(ws)
 
+def _write_file(d, name, code):
+    if isinstance(code, str):
+        code = code.encode('utf-8')
+    fd = os.open(os.path.join(d, name),
+                 os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.write(fd, code)
+    finally:
+        os.close(fd)
+
 @contextlib.contextmanager
 def TempDirectory(files):
     with tempfile.TemporaryDirectory(prefix='aiy-') as d:
-        for name, code in files.items():
-            with open(os.path.join(d, name), 'wb') as f:
-                f.write(code.encode('utf-8'))
-                f.flush()
+        if files:
+            # The writes hit independent inodes and release the GIL, so
+            # they overlap well on slow SD storage.
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(8, len(files))) as executor:
+                list(executor.map(lambda item: _write_file(d, *item),
+                                  files.items()))
         yield d
 
 @contextlib.contextmanager
@@ -94,13 +125,16 @@ CONVERT = {
     'null': asyncio.subprocess.DEVNULL
 }
 
+# Snapshot of the server environment, merged with per-run overrides.
+_BASE_ENV = dict(os.environ)
+
 async def start_process(args, stdout, stderr, env, cwd):
     logger.info('Starting process: %s.', args)
     process = await asyncio.create_subprocess_exec(*args,
                                     stdin=asyncio.subprocess.PIPE,
                                     stdout=CONVERT[stdout],
                                     stderr=CONVERT[stderr],
-                                    env=collections.ChainMap(env, os.environ),
+                                    env={**_BASE_ENV, **env} if env else _BASE_ENV,
                                     cwd=cwd)
     logger.info('Process (pid=%d) has been started.', process.pid)
     return process
@@ -122,10 +156,6 @@ def signal_process(process, signum):
     logger.info('Sending signal %d to process (pid=%d).', signum, process.pid)
     process.send_signal(signum)
 
-def stream_msg(data, kind):
-    return {'type': kind,
-            'data': base64.b64encode(data).decode('utf-8')}
-
 def exit_msg(code):
     return {'type': 'exit',
             'code': code}
@@ -137,7 +167,7 @@ def parse_run_msg(msg):
     if validate_msg(msg).get('type') != 'run':
         return None
     return msg['args'], \
-           msg.get('chunk_size', 1024), \
+           msg.get('chunk_size', 64 * 1024), \
            msg.get('stdout', 'pipe'), \
            msg.get('stderr', 'pipe'), \
            msg.get('env', {}), \
@@ -148,39 +178,38 @@ def parse_signal_msg(msg):
         return None
     return msg['signum'],
 
-def parse_stdin_msg(msg):
-    if validate_msg(msg).get('type') != 'stdin':
-        return None
-    return base64.b64decode(msg['data'].encode('utf-8')),
-
-async def ReadOp(stream, kind, chunk_size, ws):
+async def ReadOp(stream, tag, chunk_size, ws):
+    # One reusable frame buffer per stream; transport.write copies the
+    # payload out synchronously, so mutating it after send is safe.
+    frame = bytearray(tag)
     while True:
         data = await stream.read(chunk_size)
         if not data:
             break
-        await ws.send_json(stream_msg(data, kind))
+        del frame[1:]
+        frame += data
+        await ws.send_bytes(frame)
 
 async def ReceiveOp(process, ws):
     async for msg in ws:
         with LogWarning():
-            if msg.type == aiohttp.WSMsgType.TEXT:
-                parsed = json.loads(msg.data)
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                if msg.data[0] == STDIN_TAG:
+                    data = msg.data[1:]
+                    if data:
+                        process.stdin.write(data)
+                    else:
+                        process.stdin.close()
+            elif msg.type == aiohttp.WSMsgType.TEXT:
+                parsed = _JSON_DECODE(msg.data)
 
                 signal_msg = parse_signal_msg(parsed)
                 if signal_msg:
                     signum, = signal_msg
                     signal_process(process, signum)
 
-                stdin_msg = parse_stdin_msg(parsed)
-                if stdin_msg:
-                    data, = stdin_msg
-                    if data:
-                        process.stdin.write(data)
-                    else:
-                        process.stdin.close()
-
 async def communicate(ws):
-    run_msg = parse_run_msg(await ws.receive_json())
+    run_msg = parse_run_msg(await ws.receive_json(loads=_JSON_DECODE))
     if not run_msg:
         return
 
@@ -192,15 +221,17 @@ async def communicate(ws):
         try:
             operations = [wait_op]
             if process.stdout:
-                operations.append(ReadOp(process.stdout, 'stdout', chunk_size, ws))
+                operations.append(ReadOp(process.stdout, STDOUT_TAG, chunk_size, ws))
             if process.stderr:
-                operations.append(ReadOp(process.stderr, 'stderr', chunk_size, ws))
-            await asyncio.wait(operations)
+                operations.append(ReadOp(process.stderr, STDERR_TAG, chunk_size, ws))
+            # One gathering future that notifies once when everything is
+            # done, instead of asyncio.wait's per-completion wake-ups.
+            await asyncio.gather(*operations, return_exceptions=True)
         except concurrent.futures.CancelledError:
             pass
         receive_op.cancel()
         code = await wait_process(process, wait_op)
-        await ws.send_json(exit_msg(code))
+        await ws.send_str(_JSON_ENCODE(exit_msg(code)))
 
 async def spawn(request):
     ws = web.WebSocketResponse()
@@ -225,10 +256,34 @@ async def unpublish_service(app):
 def enable_validation():
     global validate_msg
 
+    with contextlib.suppress(ImportError):
+        import jsonschema_rs
+        # Rust-backed matcher; fastest option on the per-message path.
+        validator = jsonschema_rs.JSONSchema(schema.SERVER_COMMANDS)
+        def validate_msg(msg):
+            validator.validate(msg)
+            return msg
+        return
+
+    with contextlib.suppress(ImportError):
+        import fastjsonschema
+        # fastjsonschema compiles the schema to a dedicated function,
+        # much faster than walking the schema graph per message.
+        validator = fastjsonschema.compile(schema.SERVER_COMMANDS)
+        def validate_msg(msg):
+            validator(msg)
+            return msg
+        return
+
     with LogWarning('jsonschema is not installed, skipping validation.'):
         import jsonschema
+        # jsonschema.validate recompiles the schema on every call;
+        # build the validator once and reuse it per message.
+        cls = jsonschema.validators.validator_for(schema.SERVER_COMMANDS)
+        cls.check_schema(schema.SERVER_COMMANDS)
+        validator = cls(schema.SERVER_COMMANDS)
         def validate_msg(msg):
-            jsonschema.validate(msg, schema.SERVER_COMMANDS)
+            validator.validate(msg)
             return msg
 
 def main():
@@ -34,7 +34,6 @@ import glob
 import signal
 import grp
 import pwd
-import itertools
 import time
 import logging
 import inotify.adapters
@@ -63,26 +62,46 @@ def sigterm_handler(signo, stack_frame):
 def monitor_paths(paths, block_duration=1.0, callback=None):
     logger.info("Watching path %s", paths)
     i = inotify.adapters.Inotify(paths=paths, block_duration_s=block_duration)
+    # Watches stay installed; bursts of events on a path coalesce into a
+    # single callback once the path has been quiet for a moment.  The
+    # deadlines are only checked when event_gen yields, so the real
+    # debounce latency is bounded by block_duration, not 50 ms.
+    pending = {}
     try:
         for event in i.event_gen():
             if event is not None:
                 (header, type_names, watch_path, filename) = event
-                i.remove_watch(watch_path)
-                if not callback is None:
+                pending[watch_path] = time.monotonic() + 0.05
+            if pending and callback is not None:
+                now = time.monotonic()
+                due = [path for path, deadline in pending.items()
+                       if deadline <= now]
+                for watch_path in due:
+                    del pending[watch_path]
+                    # Detach the watch while the callback runs; the
+                    # chown/chmod it performs would otherwise raise
+                    # IN_ATTRIB on this very watch and re-trigger it
+                    # forever.
+                    i.remove_watch(watch_path)
                     callback(watch_path)
-                i.add_watch(watch_path)
+                    i.add_watch(watch_path)
 
     finally:
         [i.remove_watch(path) for path in pwm_chip_paths]
 
 
 def set_pwm_permissions(chip_path):
-    time.sleep(0.05)
     logger.info("Setting permission for all nodes in %s", chip_path)
-    pwm_pin_paths = glob.glob(os.path.join(chip_path, "pwm*"))
-    pwm_nodes = list(
-        itertools.chain.from_iterable(
-            [glob.glob(os.path.join(path, "*")) for path in pwm_pin_paths]))
+    pwm_pin_paths = []
+    pwm_nodes = []
+    with os.scandir(chip_path) as entries:
+        for entry in entries:
+            if not entry.name.startswith("pwm"):
+                continue
+            pwm_pin_paths.append(entry.path)
+            if entry.is_dir():
+                with os.scandir(entry.path) as nodes:
+                    pwm_nodes.extend(node.path for node in nodes)
 
     logger.info("Found pwm dev nodes %s", str(pwm_nodes))
     if pwm_nodes:
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import os
 import sys
 import shutil
@@ -52,24 +53,33 @@ MCU_I2C_ADDRESS_DICT = {
     VOICEBONNET_PROUDCT: 0x52
 }
 
+_VERSION_RE = re.compile(r"^OK-V(?P<version>\d\.\d)")
 
+
+def _slurp(path, n=256):
+    """Reads a small sysfs file without buffered I/O overhead."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, n).decode("ascii", "replace").rstrip("\x00 \n\r\t")
+    finally:
+        os.close(fd)
+
+
+@functools.lru_cache(maxsize=None)
 def get_product_name():
     if not os.path.exists(HAT_PRODUCT_NAME_PATH):
         logger.error(
             "Hat overlay not loaded. MCU never flashed? Board connected?")
         sys.exit(1)
-    with open(HAT_PRODUCT_NAME_PATH, "r") as f:
-        hat_product_name = str(f.read()).strip("\x00").strip()
-    return hat_product_name
+    return _slurp(HAT_PRODUCT_NAME_PATH)
 
 
+@functools.lru_cache(maxsize=None)
 def get_product_version():
     if not os.path.exists(HAT_PRODUCT_VERSION_PATH):
         logger.error("Hat overlay version not found.")
         sys.exit(1)
-    with open(HAT_PRODUCT_VERSION_PATH, "r") as f:
-        hat_product_version = str(f.read()).strip("\x00").strip()
-    return hat_product_version
+    return _slurp(HAT_PRODUCT_VERSION_PATH)
 
 
 def get_firmware_path():
@@ -82,6 +92,7 @@ def get_firmware_path():
     return firmware_path
 
 
+@functools.lru_cache(maxsize=None)
 def get_i2c_address():
     mcu_i2c_address = MCU_I2C_ADDRESS_DICT.get(get_product_name())
     if mcu_i2c_address is None:
@@ -91,17 +102,17 @@ def get_i2c_address():
 
 
 def get_status_message():
-    if not os.path.exists(AIY_IO_STATUS_MESSAGE_PATH % get_i2c_address()):
+    status_message_path = AIY_IO_STATUS_MESSAGE_PATH % get_i2c_address()
+    if not os.path.exists(status_message_path):
         logger.error("Status message not available, is the module loaded?")
         sys.exit(1)
-    with open(AIY_IO_STATUS_MESSAGE_PATH % get_i2c_address(), "r") as status_file:
-        status_message = status_file.read()
-        logger.info("Status - %s", status_message)
-        return status_message
+    status_message = _slurp(status_message_path)
+    logger.info("Status - %s", status_message)
+    return status_message
 
 
 def get_version_string(status_message):
-    mat = re.match("^OK-V(?P<version>\d.\d)", status_message)
+    mat = _VERSION_RE.match(status_message)
     if not mat:
         logger.error("Failed to find version string instead %s.",
                      status_message)
@@ -17,13 +17,29 @@ Common utilities for building image.
 """
 
 import contextlib
-import distutils.spawn
+import functools
 import os
+import shlex
 import shutil
 import subprocess
 import sys
 
-from imgtools import SECTOR_BYTES, Mount, MountAt, BindMount, LoopDev, resize2fs, resize_part, get_partition_info
+from imgtools import SECTOR_BYTES, Mount, MountAt, BindMount, LoopDev, flush_loop_cache, resize2fs, resize_part, get_partition_info
+
+# Environment for commands run inside the image. en_US isn't installed on
+# the default RPi image, so use C; QEMU_CPU selects armv6l for
+# compatability with Pi Zero.
+_STATIC_ENV = (
+    'LANG=C.UTF-8',
+    'LANGUAGE=C:',
+    'LC_CTYPE=C.UTF-8',
+    'QEMU_CPU=arm1176',
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _find_qemu():
+  return shutil.which('qemu-arm-static')
 
 
 def do_expand(args, image_file, expand_bytes=(2 ** 30)):
@@ -33,7 +49,10 @@ def do_expand(args, image_file, expand_bytes=(2 ** 30)):
 
   print('Extending the image file by %d bytes' % expand_bytes)
   with open(image_file, 'ab') as f:
-    f.truncate(f.tell() + expand_bytes)
+    # Preallocate real extents instead of punching a sparse hole with
+    # truncate; the later partition and filesystem writes then land in
+    # contiguous blocks instead of fragmenting the loop-backed image.
+    os.posix_fallocate(f.fileno(), 0, f.tell() + expand_bytes)
 
   with LoopDev(args, image_file) as disk_dev:
     partition_info = get_partition_info(args, disk_dev)
@@ -48,9 +67,18 @@ def do_expand(args, image_file, expand_bytes=(2 ** 30)):
   with LoopDev(args, image_file, offset=start_bytes) as root_dev:
     new_size_bytes = resize2fs(args, root_dev, 'maximum')
     print('Resized to %.1f GB' % (new_size_bytes / (2 ** 30)))
-    subprocess.check_call(['sudo', 'zerofree', root_dev],
+
+  # Sparsify free space rather than zeroing it: fstrim discards free
+  # blocks through the loop device, punching holes in the backing file,
+  # and fallocate -d digs holes for any zeroed extents that remain.
+  # Unlike zerofree this walks extents instead of reading every block.
+  with Mount(args, image_file, offset=start_bytes) as root_mnt:
+    subprocess.check_call(['sudo', 'fstrim', root_mnt],
                           stdout=args.stdout, stderr=args.stderr)
-    print('Zeroed free blocks')
+  flush_loop_cache()
+  subprocess.check_call(['fallocate', '-d', image_file],
+                        stdout=args.stdout, stderr=args.stderr)
+  print('Discarded free blocks')
 
 @contextlib.contextmanager
 def SetupEmulator(args, root_mnt):
@@ -61,7 +89,7 @@ def SetupEmulator(args, root_mnt):
 
   ld_so_preload_path = os.path.join(root_mnt, 'etc', 'ld.so.preload')
   ld_so_preload_backup = ld_so_preload_path + '.bak'
-  qemu_src_path = distutils.spawn.find_executable('qemu-arm-static')
+  qemu_src_path = _find_qemu()
   qemu_dst_path = os.path.join(root_mnt, 'usr', 'bin', 'qemu-arm-static')
 
   if qemu_src_path is None:
@@ -137,12 +165,49 @@ def run_in_chroot(args, root_mnt, cmd, env=None):
   elif cmd[0].startswith('/') or not os.path.isfile(os.path.join(root_mnt, cmd[0])):
     raise ValueError('cmd[0] must be a relative path to a binary in the image')
 
-  env_list = ['%s=%s' % item for item in (env or {}).items()] + [
-      'LANG=C.UTF-8',  # en_US isn't installed on the default RPi image, so use C
-      'LANGUAGE=C:',
-      'LC_CTYPE=C.UTF-8',
-      'QEMU_CPU=arm1176',  # Use armv6l for compatability with Pi Zero.
-  ]
+  env_list = tuple('%s=%s' % item for item in (env or {}).items()) + _STATIC_ENV
 
-  chroot_cmd = ['sudo'] + env_list + ['chroot', '.'] + cmd
+  chroot_cmd = ('sudo',) + env_list + ('chroot', '.') + tuple(cmd)
   return subprocess.call(chroot_cmd, cwd=root_mnt, stdout=args.stdout, stderr=args.stderr)
+
+
+class ChrootShell(object):
+  '''Persistent shell chrooted into the image.
+
+  Each run_in_chroot call pays sudo and chroot startup; when a build runs
+  many small commands, keeping one chrooted bash alive and feeding it
+  commands over stdin amortizes that cost. Exit statuses come back over a
+  FIFO in the image's /tmp so command output still goes straight to
+  args.stdout/args.stderr.
+  '''
+
+  def __init__(self, args, root_mnt, env=None):
+    env_list = tuple('%s=%s' % item for item in (env or {}).items()) + _STATIC_ENV
+    self._status_name = 'chroot_shell_%d.status' % os.getpid()
+    self._status_path = os.path.join(root_mnt, 'tmp', self._status_name)
+    os.mkfifo(self._status_path)
+    self._process = subprocess.Popen(
+        ('sudo',) + env_list + ('chroot', '.', '/bin/bash', '-s'),
+        cwd=root_mnt, stdin=subprocess.PIPE,
+        stdout=args.stdout, stderr=args.stderr,
+        universal_newlines=True)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def run(self, cmd):
+    '''Runs cmd (an argument list) in the shell, returns its exit status.'''
+    quoted = ' '.join(shlex.quote(part) for part in cmd)
+    self._process.stdin.write(
+        '%s\necho $? > /tmp/%s\n' % (quoted, self._status_name))
+    self._process.stdin.flush()
+    with open(self._status_path) as status:
+      return int(status.read())
+
+  def close(self):
+    self._process.stdin.close()
+    self._process.wait()
+    os.unlink(self._status_path)
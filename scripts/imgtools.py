@@ -16,33 +16,169 @@
 Tools for working with images of SD cards, in particular for the Raspberry Pi.
 """
 
+import atexit
 import collections
 from contextlib import contextmanager
+import hashlib
+import json
+import os
 import re
+import select
+import shlex
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
 
 SECTOR_BYTES = 512
 
+_RESIZE_TO_RE = re.compile(r'to (\d+) \(4k\) blocks')
+_RESIZE_ALREADY_RE = re.compile(r'already (\d+) \(4k\) blocks')
+
+
+class _SudoShell(object):
+  '''Long-lived root shell shared by all imgtools helpers.
+
+  Every sudo invocation pays fork/exec plus PAM session setup, which
+  dominates the short commands used here. The shell is started on first
+  use; commands are piped to its stdin and a sentinel line carries the
+  exit status back.
+  '''
+
+  _instance = None
+  _instance_lock = threading.Lock()
+
+  @classmethod
+  def Get(cls):
+    with cls._instance_lock:
+      if cls._instance is None:
+        cls._instance = cls()
+      return cls._instance
+
+  def __init__(self):
+    # Run is serialized: callers on other threads (shell_image's
+    # prefetch, wait_many users) must not interleave commands on the
+    # single shell's stdin or steal each other's output.
+    self._lock = threading.Lock()
+    self._process = subprocess.Popen(
+        ['sudo', '/bin/sh'], stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        universal_newlines=True)
+
+  def Run(self, cmd):
+    '''Runs an argument list as root, returns (exit status, output).'''
+    quoted = ' '.join(shlex.quote(part) for part in cmd)
+    with self._lock:
+      # The printf starts with a newline so the sentinel begins its own
+      # line even when the command's output lacks a trailing newline;
+      # that injected newline is stripped from the output below.
+      self._process.stdin.write(
+          '{ %s; } 2>&1\nprintf \'\\n__END__ %%d\\n\' "$?"\n' % quoted)
+      self._process.stdin.flush()
+      lines = []
+      for line in self._process.stdout:
+        if line.startswith('__END__ '):
+          output = ''.join(lines)
+          return int(line.split()[1]), output[:-1]
+        lines.append(line)
+      raise RuntimeError('sudo shell exited unexpectedly:\n' + ''.join(lines))
+
+
+def _sudo_call(cmd, stdout=None, stderr=None):
+  '''check_call lookalike routed through the shared sudo shell.'''
+  if cmd[0] == 'sudo':
+    cmd = cmd[1:]
+  status, output = _SudoShell.Get().Run(cmd)
+  if stdout is None and output:
+    sys.stdout.write(output)
+  if status != 0:
+    # check_output captures bytes, so keep .output bytes for handlers.
+    raise subprocess.CalledProcessError(status, cmd, output.encode())
+  return 0
+
+
+def _sudo_output(cmd):
+  '''check_output lookalike routed through the shared sudo shell.'''
+  if cmd[0] == 'sudo':
+    cmd = cmd[1:]
+  status, output = _SudoShell.Get().Run(cmd)
+  if status != 0:
+    raise subprocess.CalledProcessError(status, cmd, output.encode())
+  return output
+
+
+def wait_many(popens):
+  '''Waits for several Popen children concurrently.
+
+  With pidfd support (Linux >= 5.3, Python >= 3.9) one poll call blocks
+  until any child exits, so a batch of parallel subprocesses is reaped
+  as each finishes instead of in submission order.
+
+  Returns the exit codes in the order the children were given.
+  '''
+
+  if hasattr(os, 'pidfd_open'):
+    pidfds = []
+    try:
+      poller = select.poll()
+      for p in popens:
+        fd = os.pidfd_open(p.pid)
+        pidfds.append(fd)
+        poller.register(fd, select.POLLIN)
+      remaining = len(pidfds)
+      while remaining:
+        for fd, _ in poller.poll():
+          poller.unregister(fd)
+          remaining -= 1
+    except OSError:
+      pass  # Fall through to plain waits.
+    finally:
+      for fd in pidfds:
+        os.close(fd)
+
+  return [p.wait() for p in popens]
+
+# Loop devices attached so far, keyed by (image path, offset). Attaching
+# is expensive relative to a dict lookup, and the scripts often loop over
+# the same image several times in a row.
+_loop_cache = {}
+
+def flush_loop_cache():
+  '''Detaches all cached loop devices.
+
+  Must be called before an operation that invalidates the attachments,
+  such as truncating or hole-punching the backing image file.
+  '''
+  while _loop_cache:
+    _, dev = _loop_cache.popitem()
+    try:
+      _sudo_call(['losetup', '-d', dev], stdout=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+      pass
+
+atexit.register(flush_loop_cache)
+
 @contextmanager
 def LoopDev(args, image, offset=0):
-  '''Creates a loopback device for a file.
+  '''Creates (or reuses) a loopback device for a file.
   args: args struct with verbosity settings
   image: path to image
   offset: offset in image to skip (in bytes)
+
+  The device stays attached after the context exits; it is reused by
+  later LoopDev calls for the same image and offset and detached at
+  process exit (or by flush_loop_cache).
   '''
 
-  output = subprocess.check_output(
-      ['sudo', 'losetup', '-f', '--show', '-o', str(offset), image],
-      stderr=subprocess.STDOUT).decode('utf-8')
-  dev = output.strip()
+  key = (os.path.abspath(image), offset)
+  dev = _loop_cache.get(key)
+  if dev is None:
+    output = _sudo_output(['losetup', '-f', '--show', '-o', str(offset), image])
+    dev = output.strip()
+    _loop_cache[key] = dev
 
-  try:
-    yield dev
-  finally:
-    subprocess.check_call(['sudo', 'losetup', '-d', dev],
-                          stdout=args.stdout, stderr=args.stderr)
+  yield dev
 
 @contextmanager
 def MountAt(args, image, mountpoint, offset=0):
@@ -54,14 +190,21 @@ def MountAt(args, image, mountpoint, offset=0):
   '''
 
   with LoopDev(args, image, offset) as loop_dev:
-    subprocess.check_call(['sudo', 'mount', loop_dev, mountpoint],
-                          stdout=args.stdout, stderr=args.stderr)
+    _sudo_call(['mount', loop_dev, mountpoint],
+               stdout=args.stdout, stderr=args.stderr)
 
     try:
       yield mountpoint
     finally:
-      subprocess.check_call(['sudo', 'umount', mountpoint],
-                            stdout=args.stdout, stderr=args.stderr)
+      _sudo_call(['umount', mountpoint],
+                 stdout=args.stdout, stderr=args.stderr)
+
+def _make_mountpoint():
+  # Prefer a RAM-backed directory; the mountpoint itself never needs to
+  # touch the disk.
+  if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+    return tempfile.mkdtemp(prefix='imgtools_', dir='/dev/shm')
+  return tempfile.mkdtemp(prefix='imgtools_')
 
 @contextmanager
 def Mount(args, image, offset=0):
@@ -71,9 +214,12 @@ def Mount(args, image, offset=0):
   offset: offset in image to skip (in bytes)
   '''
 
-  with tempfile.TemporaryDirectory() as mountpoint:
+  mountpoint = _make_mountpoint()
+  try:
     with MountAt(args, image, mountpoint, offset):
       yield mountpoint
+  finally:
+    os.rmdir(mountpoint)
 
 @contextmanager
 def BindMount(args, olddir, newdir):
@@ -83,18 +229,28 @@ def BindMount(args, olddir, newdir):
   newdir: mountpoint for bind mount
   '''
 
-  subprocess.check_call(['sudo', 'mount', '--bind', olddir, newdir],
-                        stdout=args.stdout, stderr=args.stderr)
+  _sudo_call(['mount', '--bind', olddir, newdir],
+             stdout=args.stdout, stderr=args.stderr)
 
   try:
     yield newdir
   finally:
-    subprocess.check_call(['sudo', 'umount', newdir],
-                          stdout=args.stdout, stderr=args.stderr)
+    _sudo_call(['umount', newdir],
+               stdout=args.stdout, stderr=args.stderr)
 
+# All readers use parted's encoding: part_type is 'primary', 'extended'
+# or 'logical', and fs is a best-effort filesystem name, '' when the
+# reader cannot determine one (sfdisk and the MBR parser do not probe
+# filesystems; fs is a hint, never dispatch on it).
 PartitionInfo = collections.namedtuple(
     'PartitionInfo', ['number', 'start', 'end', 'size', 'part_type', 'fs'])
 
+# MBR type ids of extended partitions.
+_EXTENDED_TYPE_IDS = (0x05, 0x0f)
+
+# Partition number at the end of a device node like /dev/loop0p5.
+_PART_NODE_RE = re.compile(r'(\d+)$')
+
 def get_partition_info(args, disk_dev):
   '''Get the info of the given partition.
   args: args struct with verbosity settings
@@ -104,37 +260,152 @@ def get_partition_info(args, disk_dev):
     1-based dictionary of PartitionInfo instances
   '''
 
-  parted_out = subprocess.check_output(
-      ['sudo', 'parted', '-s', disk_dev, 'unit', 's', 'print'],
-      stderr=subprocess.STDOUT).decode('utf-8')
+  sfdisk_out = _sudo_output(['sfdisk', '--json', disk_dev])
   if args.verbose:
-    sys.stdout.write(parted_out)
+    sys.stdout.write(sfdisk_out)
 
   info = {}
+  partitions = json.loads(sfdisk_out)['partitiontable']['partitions']
+  for part in partitions:
+    # Take the real number from the node name; list positions diverge
+    # from partition numbers on extended layouts, where logical
+    # partitions start at 5.
+    number = int(_PART_NODE_RE.search(part['node']).group(1))
+    start = part['start']
+    size = part['size']
+    try:
+      extended = int(part['type'], 16) in _EXTENDED_TYPE_IDS
+    except ValueError:
+      extended = False  # GPT type GUID.
+    if extended:
+      part_type = 'extended'
+    elif number >= 5:
+      part_type = 'logical'
+    else:
+      part_type = 'primary'
+    info[number] = PartitionInfo(number, start, start + size - 1, size,
+                                 part_type, '')
+  return info
+
+_PARTED_ROW_RE = re.compile(
+    r'^\s*(\d+)\s+(\d+)s\s+(\d+)s\s+(\d+)s\s+(\S+)\s+(\S+)', re.M)
+
+def _parse_parted_output(parted_out):
+  # A single regex pass picks out just the numbered partition rows; no
+  # per-line splitting or exception-driven filtering of header lines.
+  return {
+      int(m.group(1)): PartitionInfo(int(m.group(1)), int(m.group(2)),
+                                     int(m.group(3)), int(m.group(4)),
+                                     m.group(5), m.group(6))
+      for m in _PARTED_ROW_RE.finditer(parted_out)
+  }
+
+# status, chs_start, type, chs_end, lba_start, num_sectors
+_MBR_ENTRY = struct.Struct('<B3sB3sII')
+
+# Best-effort fs names for the MBR type ids found on Raspberry Pi
+# images, matching what parted reports for them.
+_MBR_FS_NAMES = {0x0b: 'fat32', 0x0c: 'fat32', 0x0e: 'fat16', 0x83: 'ext4'}
+
+def read_partition_info_native(image_file):
+  '''Parses the MBR partition table straight out of the image file.
+
+  Reading a partition table needs neither a loop device nor parted nor
+  root: the MBR lives in the first 512 bytes. Returns the same 1-based
+  dict as read_partition_info, or None for GPT or extended layouts,
+  which the subprocess path still handles.
+  '''
 
-  for line in parted_out.splitlines():
-    fields = line.strip().split()
+  with open(image_file, 'rb') as f:
+    mbr = f.read(512)
+  if len(mbr) < 512 or mbr[510:512] != b'\x55\xaa':
+    return None
 
-    if len(fields) < 6:
+  info = {}
+  for i in range(4):
+    _, _, part_type, _, lba_start, num_sectors = _MBR_ENTRY.unpack_from(
+        mbr, 446 + 16 * i)
+    if part_type in _EXTENDED_TYPE_IDS + (0xee,):  # extended or GPT
+      return None
+    if num_sectors == 0:
       continue
+    info[i + 1] = PartitionInfo(i + 1, lba_start,
+                                lba_start + num_sectors - 1, num_sectors,
+                                'primary', _MBR_FS_NAMES.get(part_type, ''))
+  return info
 
-    number, start, end, size, part_type, fs = fields[:6]
+def _partition_cache_dir():
+  '''Per-user cache directory, created 0700.
 
-    try:
-      number = int(number)
-      start = int(start.strip('s'))
-      end = int(end.strip('s'))
-      size = int(size.strip('s'))
-    except ValueError:
-      continue
+  /dev/shm is world-writable, so the directory is keyed by uid and
+  rejected unless we own it; entries inside are taken at face value.
+  '''
+  if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+    cache_dir = '/dev/shm/imgtools_cache_%d' % os.getuid()
+  else:
+    cache_dir = os.path.expanduser('~/.cache/imgtools')
+  os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+  if os.stat(cache_dir).st_uid != os.getuid():
+    raise OSError('%s is not owned by the current user' % cache_dir)
+  return cache_dir
+
+def read_partition_info(args, image_file):
+  '''Reads the partition table of an image file.
 
-    info[number] = PartitionInfo(number, start, end, size, part_type, fs)
+  Results are cached on disk keyed by the image's inode, mtime and size,
+  so repeated invocations over an unchanged image skip both the MBR read
+  and the parted fallback. Any write to the image bumps the mtime and
+  invalidates the entry automatically.
+  '''
 
+  real_path = os.path.realpath(image_file)
+  st = os.stat(real_path)
+  key = [real_path, st.st_ino, st.st_mtime_ns, st.st_size]
+  cache_path = None
+  try:
+    cache_path = os.path.join(
+        _partition_cache_dir(),
+        hashlib.sha1(real_path.encode('utf-8')).hexdigest() + '.json')
+    with open(cache_path) as f:
+      cached = json.load(f)
+    if cached['key'] == key:
+      return {int(number): PartitionInfo(*fields)
+              for number, fields in cached['info'].items()}
+  except (OSError, ValueError, KeyError, TypeError):
+    pass
+
+  info = _read_partition_info_uncached(args, image_file)
+
+  if cache_path is not None:
+    try:
+      with open(cache_path, 'w') as f:
+        json.dump({'key': key,
+                   'info': {number: list(part)
+                            for number, part in info.items()}}, f)
+    except OSError:
+      pass
   return info
 
-def read_partition_info(args, image_file):
-  with LoopDev(args, image_file) as disk_dev:
-    return get_partition_info(args, disk_dev)
+def _read_partition_info_uncached(args, image_file):
+  info = read_partition_info_native(image_file)
+  if info is not None:
+    return info
+
+  # Attach, print and detach in a single root round-trip instead of
+  # three; the loop device name is captured into a shell variable so
+  # the output is parted's alone.
+  script = ('dev=$(losetup -f --show -o 0 %s) || exit\n'
+            'parted -s "$dev" unit s print\n'
+            'status=$?\n'
+            'losetup -d "$dev"\n'
+            'exit $status' % shlex.quote(image_file))
+  status, parted_out = _SudoShell.Get().Run(['sh', '-c', script])
+  if status != 0:
+    raise subprocess.CalledProcessError(status, 'read_partition_info',
+                                        parted_out.encode())
+  if args.verbose:
+    sys.stdout.write(parted_out)
+  return _parse_parted_output(parted_out)
 
 def resize2fs(args, ext_dev, size='minimum'):
   '''Resize an ext2/3/4 filesystem.
@@ -146,23 +417,21 @@ def resize2fs(args, ext_dev, size='minimum'):
     new size in bytes
   '''
 
-  subprocess.check_call(['sudo', 'e2fsck', '-yf', ext_dev],
-                        stdout=args.stdout, stderr=args.stderr)
+  _sudo_call(['e2fsck', '-yf', ext_dev],
+             stdout=args.stdout, stderr=args.stderr)
 
   if size == 'minimum':
-    cmd = ['sudo', 'resize2fs', '-M', ext_dev]
+    cmd = ['resize2fs', '-M', ext_dev]
   elif size == 'maximum':
-    cmd = ['sudo', 'resize2fs', ext_dev]
+    cmd = ['resize2fs', ext_dev]
   else:
     raise ValueError('size must be "minimum" or "maximum", not %r' % size)
 
-  resize_out = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
+  resize_out = _sudo_output(cmd)
   if args.verbose:
     sys.stdout.write(resize_out)
 
-  m = re.search(r'to (\d+) \(4k\) blocks', resize_out)
-  if m is None:
-    m = re.search(r'already (\d+) \(4k\) blocks', resize_out)
+  m = _RESIZE_TO_RE.search(resize_out) or _RESIZE_ALREADY_RE.search(resize_out)
   if m is None:
     print("Couldn't determine new size from resize2fs output:\n" + resize_out, file=sys.stderr)
     sys.exit(1)
@@ -177,15 +446,12 @@ def resize_part(args, disk_dev, partition_number, new_start_sector, new_end_sect
   new_start_sector: sector number of the new start
   new_end_sector: sector number of the new end
   '''
-  commands = '\n'.join([
-      # delete old partition
-      'd', str(partition_number),
-      # recreate with new size
-      'n', 'p', str(partition_number), str(new_start_sector), str(new_end_sector),
-      # write table to disk and exit
-      'w',
-  ]) + '\n'
-  p = subprocess.Popen(['sudo', 'fdisk', disk_dev], stdin=subprocess.PIPE,
-                       stdout=args.stdout, stderr=args.stderr)
-  p.communicate(input=commands.encode('utf-8'))
-  # ignore code, as fdisk returns 1 even when it works
+  # sfdisk takes the new geometry on stdin non-interactively and returns
+  # a real exit code, unlike fdisk's d/n/p/w dialogue which exits 1 even
+  # when it works.
+  script = b'%d,%d,L\n' % (new_start_sector,
+                           new_end_sector - new_start_sector + 1)
+  subprocess.run(
+      ['sudo', 'sfdisk', '--no-reread', '-N', str(partition_number), disk_dev],
+      input=script, check=True,
+      stdout=args.stdout, stderr=args.stderr)
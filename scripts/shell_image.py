@@ -18,6 +18,7 @@ Run shell on Raspbian image.
 """
 
 import argparse
+import concurrent.futures
 import sys
 
 from build_common import MountAndSetupEmulator, run_in_chroot
@@ -42,16 +43,21 @@ def main():
   args = parser.parse_args()
   args.stdout, args.stderr = None, None
 
-  cmd = ['bin/bash']
-  if args.command:
-    cmd += ['-c', args.command]
+  # Read the partition table in the background; it is subprocess-bound,
+  # so preparing the command and mount list overlaps with it for free.
+  with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+    partition_info_op = pool.submit(read_partition_info, args, args.image)
 
-  if args.arg:
-    cmd += ['/dev/stdin'] + args.arg
+    cmd = ['bin/bash']
+    if args.command:
+      cmd += ['-c', args.command]
 
-  mounts = [tuple(mount.split(':')) for mount in (args.mount or [])]
+    if args.arg:
+      cmd += ['/dev/stdin'] + args.arg
 
-  partition_info = read_partition_info(args, args.image)
+    mounts = [tuple(mount.split(':')) for mount in (args.mount or [])]
+
+    partition_info = partition_info_op.result()
   with MountAndSetupEmulator(args, partition_info, args.image, mounts) as root_mnt:
     print('Starting emulator at %s...' % root_mnt)
     sys.exit(run_in_chroot(args, root_mnt, cmd))
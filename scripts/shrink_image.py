@@ -24,7 +24,7 @@ import stat
 import subprocess
 import sys
 
-from imgtools import SECTOR_BYTES, LoopDev, Mount, get_partition_info, resize2fs, resize_part
+from imgtools import SECTOR_BYTES, LoopDev, Mount, flush_loop_cache, get_partition_info, resize2fs, resize_part
 
 def log(args, *msg):
   if args.verbose:
@@ -60,6 +60,7 @@ def do_resize(args):
       sys.exit(1)
 
   print('Truncating image..')
+  flush_loop_cache()
   with open(args.image, 'ab') as f:
     total_size_bytes = start_sector * SECTOR_BYTES + new_size_bytes
     f.truncate(total_size_bytes)